@@ -1,13 +1,23 @@
 import re
-import ast
 import subprocess
 import os
-import json
 import requests
+from io import StringIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 from typing import Dict, List, Optional, Tuple, Any
 
+from analyzer import parse_or_errors
+from cache import LRUCache, content_key
+
+# orjson decodes much faster than the standard library when it's installed
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
 # Dictionary of common Python error patterns and their explanations/fixes
-ERROR_PATTERNS = {
+_RAW_PATTERNS = {
     'SyntaxError: invalid syntax': {
         'explanation': 'Your code has a syntax error, which means Python cannot understand the structure.',
         'typical_fixes': ['Check for missing colons after if/for/while statements', 
@@ -95,39 +105,72 @@ ERROR_PATTERNS = {
     }
 }
 
+# All patterns fused into one alternation so the output is scanned in a single pass.
+# Each pattern gets a named group p0, p1, ... that maps back to its error name
+# (the text before the first colon) and its entry.
+MULTI_ERROR_RE = re.compile('|'.join(f'(?P<p{i}>{pattern})' for i, pattern in enumerate(_RAW_PATTERNS)))
+_PATTERN_BY_GROUP = {
+    f'p{i}': (pattern.partition(':')[0], info)
+    for i, (pattern, info) in enumerate(_RAW_PATTERNS.items())
+}
+
+# Regexes used when scanning analysis output line by line
+# pylint's "path:line:column: CODE: message" format; gives the line number and code in one match
+PYLINT_LINE_RE = re.compile(r'^[^:]+:(\d+):\d+:\s*([EWRFC]\d{4})\b')
+LINE_RE = re.compile(r'line (\d+)')
+LIKELY_ERROR_RE = re.compile(r'(?:Syntax|Indentation|Name|Type)Error')
+
+# Regexes used by fix_pylint_errors to pull names out of pylint messages
+UNDEFINED_VARIABLE_RE = re.compile(r"Undefined variable '(\w+)'")
+UNUSED_IMPORT_RE = re.compile(r"Unused import (\w+)")
+INVALID_NAME_RE = re.compile(r"Invalid name \"(\w+)\"")
+UNUSED_VARIABLE_RE = re.compile(r"Unused variable '(\w+)'")
+
+# Statements that must end with a colon
+CONTROL_PREFIXES = ('if ', 'if(', 'elif ', 'elif(', 'else', 'for ', 'while ', 'while(',
+                    'def ', 'async ', 'class ', 'try', 'except', 'finally', 'with ', 'with(')
+
+# Shared session so connections to the local LLM services are kept alive between calls
+_SESSION = requests.Session()
+_SESSION.mount('http://', HTTPAdapter(pool_connections=8, pool_maxsize=16))
+
+# Recent suggestions, keyed by the code and its analysis
+_SUGGESTION_CACHE = LRUCache(maxsize=1024)
+
 def get_improvement_suggestions(code: str, analysis_output: str, error_count: int, warning_count: int) -> Dict[str, Any]:
     """
     Generate improvement suggestions for Python code based on the analysis output.
     Uses rule-based suggestions rather than external API calls.
     """
-    # Try to parse the code to identify syntax and logical issues
-    syntax_errors = []
-    try:
-        ast.parse(code)
-    except SyntaxError as e:
-        syntax_errors.append({
-            'line': e.lineno,
-            'column': e.offset,
-            'message': str(e)
-        })
+    key = content_key(code, analysis_output, str(error_count), str(warning_count))
+    suggestions = _SUGGESTION_CACHE.get(key)
+    if suggestions is None:
+        suggestions = _get_improvement_suggestions(code, analysis_output, error_count, warning_count)
+        _SUGGESTION_CACHE.put(key, suggestions)
+    return suggestions
+
+def _get_improvement_suggestions(code: str, analysis_output: str, error_count: int, warning_count: int) -> Dict[str, Any]:
+    """Build the suggestions for get_improvement_suggestions."""
+    # Try to parse the code to identify syntax and logical issues.
+    # The parse is shared with analyze_python_code, so chained calls only parse once.
+    _, syntax_errors = parse_or_errors(code)
 
     # Extract error codes from the analysis output
+    # Lines are read one at a time rather than split into a list up front
     error_matches = []
-    for line in analysis_output.split('\n'):
-        # Look for various error code patterns
-        pylint_match = re.search(r'([EWRFC]\d{4})', line)
-        line_match = re.search(r'line (\d+)', line)
-        
+    for line in StringIO(analysis_output):
+        line = line.rstrip('\n')
+        # Look for pylint messages first
+        pylint_match = PYLINT_LINE_RE.match(line)
         if pylint_match:
-            error_code = pylint_match.group(1)
-            line_num = int(line_match.group(1)) if line_match else 0
             error_matches.append({
-                'code': error_code,
-                'line_num': line_num,
+                'code': pylint_match.group(2),
+                'line_num': int(pylint_match.group(1)),
                 'message': line
             })
         # Also check for standard Python error patterns
-        elif any(pattern in line for pattern in ['SyntaxError', 'IndentationError', 'NameError', 'TypeError']):
+        elif LIKELY_ERROR_RE.search(line):
+            line_match = LINE_RE.search(line)
             if line_match:
                 line_num = int(line_match.group(1))
                 error_matches.append({
@@ -142,19 +185,29 @@ def get_improvement_suggestions(code: str, analysis_output: str, error_count: in
     explanation = ""
     learning_tip = ""
 
+    # The fixers edit one shared list of lines, which is joined back once at the end
+    lines = code.split('\n') if syntax_errors or error_matches else []
+
     # Fix syntax errors first
     if syntax_errors:
-        improved_code, new_improvements = fix_syntax_errors(code, syntax_errors)
+        lines, new_improvements = fix_syntax_errors(lines, syntax_errors)
         improvements.extend(new_improvements)
         explanation = "Your code has syntax errors that need to be fixed before it can run."
         learning_tip = "Always check for syntax errors first. Python won't run your code until all syntax errors are fixed."
 
     # Then apply fixes for pylint errors
     elif error_matches:
-        improved_code, new_improvements = fix_pylint_errors(code, error_matches)
-        improvements.extend(new_improvements)
-        explanation = "Your code has some style and potential logical issues that should be addressed."
-        learning_tip = "Following Python style guidelines makes your code more readable and less prone to errors."
+        lines, new_improvements = fix_pylint_errors(lines, error_matches)
+        # Fixes can break working code, e.g. commenting out the only statement of a
+        # function leaves its body empty, so they are only kept if the result still parses
+        if new_improvements and not parse_or_errors('\n'.join(lines))[1]:
+            improvements.extend(new_improvements)
+            explanation = "Your code has some style and potential logical issues that should be addressed."
+            learning_tip = "Following Python style guidelines makes your code more readable and less prone to errors."
+
+    # Every applied fix is reported, so the lines only changed if there are improvements
+    if improvements:
+        improved_code = '\n'.join(lines)
 
     # If we didn't find specific errors but analysis reports errors
     if not improvements and (error_count > 0 or warning_count > 0):
@@ -162,10 +215,17 @@ def get_improvement_suggestions(code: str, analysis_output: str, error_count: in
         learning_tip = "Read error messages carefully - they often tell you exactly what's wrong and where to look."
         
         # Look for common error patterns in the raw output
-        for pattern, info in ERROR_PATTERNS.items():
-            if re.search(pattern, analysis_output):
+        matched_groups = set()
+        for match in MULTI_ERROR_RE.finditer(analysis_output):
+            matched_groups.add(match.lastgroup)
+            if len(matched_groups) == len(_PATTERN_BY_GROUP):
+                break
+        
+        # Report in pattern order, once per pattern
+        for group, (error_name, info) in _PATTERN_BY_GROUP.items():
+            if group in matched_groups:
                 improvements.append({
-                    'issue': f"Potential issue: {pattern.split(':')[0]}",
+                    'issue': f"Potential issue: {error_name}",
                     'solution': info['explanation'] + " " + info['typical_fixes'][0]
                 })
     
@@ -194,10 +254,11 @@ def get_improvement_suggestions(code: str, analysis_output: str, error_count: in
         "learning_tip": learning_tip or "Always test your code thoroughly, even when it looks correct."
     }
 
-def fix_syntax_errors(code: str, errors: List[Dict]) -> Tuple[str, List[Dict]]:
-    """Apply fixes to syntax errors in the code."""
-    lines = code.split('\n')
+def fix_syntax_errors(lines: List[str], errors: List[Dict]) -> Tuple[List[str], List[Dict]]:
+    """Apply fixes to syntax errors in the code, editing lines in place."""
     improvements = []
+    if not errors:
+        return lines, improvements
     
     for error in errors:
         line_num = error['line'] - 1  # 0-indexed
@@ -213,7 +274,7 @@ def fix_syntax_errors(code: str, errors: List[Dict]) -> Tuple[str, List[Dict]]:
             # More robust check for missing colon
             if not current_line.rstrip().endswith(':'):
                 # Check if this is a statement that requires a colon
-                if re.search(r'(if|elif|else|for|while|def|class)\b.*\S', current_line):
+                if current_line.lstrip().startswith(CONTROL_PREFIXES):
                     lines[line_num] = current_line.rstrip() + ':'
                     improvements.append({
                         'issue': f"Missing colon at line {error['line']}",
@@ -258,94 +319,137 @@ def fix_syntax_errors(code: str, errors: List[Dict]) -> Tuple[str, List[Dict]]:
                 'solution': "Added required indentation"
             })
     
-    return '\n'.join(lines), improvements
+    return lines, improvements
+
+def _fix_undefined_variable(current_line: str, error: Dict, improvements: List[Dict]) -> Optional[str]:
+    """Handle E0602 by adding a placeholder definition above the line."""
+    var_match = UNDEFINED_VARIABLE_RE.search(error['message'])
+    if var_match:
+        var_name = var_match.group(1)
+        improvements.append({
+            'issue': f"Undefined variable '{var_name}'",
+            'solution': f"Added a placeholder initialization. Replace 'None' with an appropriate value."
+        })
+        # Add a definition above at the same indentation, in the same entry so later line numbers stay valid
+        indent = current_line[:len(current_line) - len(current_line.lstrip())]
+        return f"{indent}{var_name} = None  # TODO: Initialize with a proper value\n{current_line}"
+    return None
+
+def _fix_unused_import(current_line: str, error: Dict, improvements: List[Dict]) -> Optional[str]:
+    """Handle W0611 by commenting out the import."""
+    import_match = UNUSED_IMPORT_RE.search(error['message'])
+    if import_match:
+        import_name = import_match.group(1)
+        # Comment out the import
+        if f"import {import_name}" in current_line:
+            improvements.append({
+                'issue': f"Unused import '{import_name}'",
+                'solution': "Commented out the unused import. Remove it if not needed."
+            })
+            return f"# {current_line}  # Unused import"
+    return None
+
+def _fix_invalid_name(current_line: str, error: Dict, improvements: List[Dict]) -> Optional[str]:
+    """Handle C0103 by renaming to follow Python naming conventions."""
+    name_match = INVALID_NAME_RE.search(error['message'])
+    if name_match:
+        invalid_name = name_match.group(1)
+        # Suggest snake_case for variables/functions or CamelCase for classes
+        if invalid_name[0].isupper():  # Likely a class name
+            suggestion = invalid_name  # Class names should be CamelCase already
+        else:
+            suggestion = _to_snake_case(invalid_name)
+        
+        # Don't replace if already in correct format
+        if suggestion != invalid_name:
+            improvements.append({
+                'issue': f"Invalid name '{invalid_name}'",
+                'solution': f"Renamed to '{suggestion}' following Python naming conventions"
+            })
+            return current_line.replace(invalid_name, suggestion)
+    return None
+
+def _to_snake_case(name: str) -> str:
+    """Convert a camelCase name to snake_case."""
+    chars = []
+    for char in name:
+        if 'A' <= char <= 'Z':
+            chars.append('_')
+        chars.append(char)
+    return ''.join(chars).lower().lstrip('_')
+
+def _fix_unused_variable(current_line: str, error: Dict, improvements: List[Dict]) -> Optional[str]:
+    """Handle W0612 by commenting out the assignment."""
+    var_match = UNUSED_VARIABLE_RE.search(error['message'])
+    if var_match:
+        var_name = var_match.group(1)
+        # Comment out the variable assignment
+        pattern = rf'\b{re.escape(var_name)}\s*='
+        if re.search(pattern, current_line):
+            improvements.append({
+                'issue': f"Unused variable '{var_name}'",
+                'solution': "Commented out the unused variable. Remove it if not needed."
+            })
+            return f"# {current_line}  # Unused variable"
+    return None
 
-def fix_pylint_errors(code: str, errors: List[Dict]) -> Tuple[str, List[Dict]]:
-    """Apply fixes to pylint errors in the code."""
-    lines = code.split('\n')
+# Fix handlers by pylint message code. Each returns the replacement line, or None to leave it.
+PYLINT_FIXERS = {
+    'E0602': _fix_undefined_variable,
+    'W0611': _fix_unused_import,
+    'C0103': _fix_invalid_name,
+    'W0612': _fix_unused_variable,
+}
+
+def fix_pylint_errors(lines: List[str], errors: List[Dict]) -> Tuple[List[str], List[Dict]]:
+    """Apply fixes to pylint errors in the code, editing lines in place."""
     improvements = []
+    if not errors:
+        return lines, improvements
     
     for error in errors:
-        error_code = error.get('code', '')
-        line_num = error.get('line_num', 0) - 1  # 0-indexed
+        fixer = PYLINT_FIXERS.get(error.get('code', ''))
+        if fixer is None:
+            continue
         
+        line_num = error.get('line_num', 0) - 1  # 0-indexed
         if line_num >= len(lines) or line_num < 0:
             continue  # Skip if line number is out of range
-            
-        current_line = lines[line_num]
         
-        # Handle undefined variable
-        if error_code == 'E0602':
-            var_match = re.search(r"Undefined variable '(\w+)'", error['message'])
-            if var_match:
-                var_name = var_match.group(1)
-                # Add a definition above
-                lines.insert(line_num, f"{var_name} = None  # TODO: Initialize with a proper value")
-                # Update line numbers since we inserted a line
-                line_num += 1
-                improvements.append({
-                    'issue': f"Undefined variable '{var_name}'",
-                    'solution': f"Added a placeholder initialization. Replace 'None' with an appropriate value."
-                })
-        
-        # Handle unused import
-        elif error_code == 'W0611':
-            import_match = re.search(r"Unused import (\w+)", error['message'])
-            if import_match:
-                import_name = import_match.group(1)
-                # Comment out the import
-                if f"import {import_name}" in current_line:
-                    lines[line_num] = f"# {current_line}  # Unused import"
-                    improvements.append({
-                        'issue': f"Unused import '{import_name}'",
-                        'solution': "Commented out the unused import. Remove it if not needed."
-                    })
-        
-        # Handle invalid names
-        elif error_code == 'C0103':
-            name_match = re.search(r"Invalid name \"(\w+)\"", error['message'])
-            if name_match:
-                invalid_name = name_match.group(1)
-                # Suggest snake_case for variables/functions or CamelCase for classes
-                if invalid_name[0].isupper():  # Likely a class name
-                    suggestion = invalid_name  # Class names should be CamelCase already
-                else:
-                    # Convert to snake_case
-                    suggestion = re.sub(r'([A-Z])', r'_\1', invalid_name).lower()
-                    suggestion = suggestion.lstrip('_')
-                
-                # Don't replace if already in correct format
-                if suggestion != invalid_name:
-                    lines[line_num] = current_line.replace(invalid_name, suggestion)
-                    improvements.append({
-                        'issue': f"Invalid name '{invalid_name}'",
-                        'solution': f"Renamed to '{suggestion}' following Python naming conventions"
-                    })
-                    
-        # Handle unused variable
-        elif error_code == 'W0612':
-            var_match = re.search(r"Unused variable '(\w+)'", error['message'])
-            if var_match:
-                var_name = var_match.group(1)
-                # Comment out the variable assignment
-                pattern = rf'\b{re.escape(var_name)}\s*='
-                if re.search(pattern, current_line):
-                    lines[line_num] = f"# {current_line}  # Unused variable"
-                    improvements.append({
-                        'issue': f"Unused variable '{var_name}'",
-                        'solution': "Commented out the unused variable. Remove it if not needed."
-                    })
+        new_line = fixer(lines[line_num], error, improvements)
+        if new_line is not None:
+            lines[line_num] = new_line
     
-    return '\n'.join(lines), improvements
+    return lines, improvements
 
 def try_local_ai_suggestion(code: str, errors: str) -> Optional[Dict[str, Any]]:
     """
     Try to get suggestions from a locally running LLM service (if available).
     Returns None if the service is not available or fails.
     """
-    # First try Ollama
+    # Ask Ollama and LocalAI at the same time and use the first usable answer,
+    # so a slow or missing service doesn't hold up the other one
+    executor = ThreadPoolExecutor(max_workers=2)
+    futures = [
+        executor.submit(_ask_ollama, code, errors),
+        executor.submit(_ask_localai, code, errors)
+    ]
+    try:
+        for future in as_completed(futures):
+            suggestion = future.result()
+            if suggestion:
+                return suggestion
+    finally:
+        # Don't wait for the other service once we have an answer
+        executor.shutdown(wait=False)
+    
+    # Return None if all methods fail
+    return None
+
+def _ask_ollama(code: str, errors: str) -> Optional[Dict[str, Any]]:
+    """Ask a local Ollama server for suggestions. Returns None on failure."""
     try:
-        response = requests.post(
+        response = _SESSION.post(
             "http://localhost:11434/api/generate",
             json={
                 "model": "codellama:7b",
@@ -372,13 +476,13 @@ Provide your response as JSON with:
         )
         
         if response.status_code == 200:
-            result = response.json()
             # Parse the response from the LLM to extract the JSON
             try:
+                result = _json.loads(response.content)
                 # Extract JSON from the response text
-                json_str = re.search(r'\{.*\}', result['response'], re.DOTALL)
+                json_str = _extract_json(result['response'])
                 if json_str:
-                    return json.loads(json_str.group(0))
+                    return _json.loads(json_str)
             except Exception as e:
                 print(f"Error parsing Ollama JSON response: {str(e)}")
                 # Fall back to rule-based
@@ -386,9 +490,12 @@ Provide your response as JSON with:
     except requests.exceptions.RequestException as e:
         print(f"Error connecting to Ollama: {str(e)}")
     
-    # If Ollama fails, try LocalAI
+    return None
+
+def _ask_localai(code: str, errors: str) -> Optional[Dict[str, Any]]:
+    """Ask a local LocalAI server for suggestions. Returns None on failure."""
     try:
-        response = requests.post(
+        response = _SESSION.post(
             "http://localhost:8080/v1/chat/completions",
             json={
                 "model": "codellama",
@@ -417,15 +524,46 @@ Provide your response as JSON with:
         )
         
         if response.status_code == 200:
-            result = response.json()
             try:
-                json_str = re.search(r'\{.*\}', result['choices'][0]['message']['content'], re.DOTALL)
+                result = _json.loads(response.content)
+                json_str = _extract_json(result['choices'][0]['message']['content'])
                 if json_str:
-                    return json.loads(json_str.group(0))
+                    return _json.loads(json_str)
             except Exception as e:
                 print(f"Error parsing LocalAI JSON response: {str(e)}")
     except requests.exceptions.RequestException as e:
         print(f"Error connecting to LocalAI: {str(e)}")
-        
-    # Return None if all methods fail
-    return None
\ No newline at end of file
+    
+    return None
+
+def _extract_json(text: str) -> Optional[str]:
+    """
+    Return the first complete {...} object in text, or None if there isn't one.
+    Scans once, tracking brace depth and skipping braces inside string literals.
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+    
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    
+    return None
@@ -1,62 +1,206 @@
-import tempfile
-import subprocess
 import os
+import sys
+import threading
 import re
 import ast
-from typing import Dict, List, Any
+from collections import Counter
+from typing import Callable, Dict, List, Any, Optional, Tuple
 
-def analyze_python_code(code: str) -> Dict[str, Any]:
+import astroid
+from pylint.interfaces import HIGH
+from pylint.lint import PyLinter
+from pylint.message import Message
+from pylint.reporters import BaseReporter, CollectingReporter
+from pylint.typing import FileItem
+
+from cache import DiskCache, LRUCache, content_key
+
+# pylint keeps global state (astroid cache, sys.path), so only one
+# in-process run may happen at a time
+_PYLINT_LOCK = threading.Lock()
+
+# Submitted code is linted from memory under this module name
+_SUBMISSION = FileItem('submission', 'submission.py', 'submission.py')
+
+class _SourceLinter(PyLinter):
+    """PyLinter that reads the module source from memory instead of from disk."""
+    source = ''
+
+    def get_ast(self, filepath, modname, data=None):
+        return super().get_ast(filepath, modname, self.source if data is None else data)
+
+def _create_linter() -> _SourceLinter:
+    """Create a linter with the default checkers loaded."""
+    linter = _SourceLinter()
+    linter.load_default_plugins()
+    linter.set_option('persistent', False)
+    return linter
+
+# Linter shared across requests so plugin loading and astroid's inference
+# cache are paid for once instead of on every analysis
+_LINTER = None
+
+class _AnalysisReporter(BaseReporter):
     """
-    Analyze Python code for errors and quality issues.
-    Returns dict with error count, error types, and raw output.
+    Reporter that tallies pylint messages as they are emitted,
+    so they never need to be collected and walked afterwards.
     """
-    result = {
-        'error_count': 0,
+    name = 'analysis'
+
+    def __init__(self):
+        super().__init__()
+        self.error_count = 0
+        self.warning_count = 0
+        self.error_types = Counter()
+        self.lines = []
+
+    def handle_message(self, msg: Message) -> None:
+        error_type = msg.msg_id
+        if error_type.startswith('E'):
+            self.error_count += 1
+            self.error_types[error_type] += 1
+        elif error_type.startswith('W'):
+            self.warning_count += 1
+            self.error_types[error_type] += 1
+        # Keep the output in pylint's usual text format
+        self.lines.append(f"{msg.path}:{msg.line}:{msg.column}: {error_type}: {msg.msg} ({msg.symbol})\n")
+
+    def _display(self, layout) -> None:
+        pass
+
+def _lint(linter: _SourceLinter, code: str, reporter: BaseReporter) -> BaseReporter:
+    """Run a single check of code with the given linter."""
+    linter.set_reporter(reporter)
+    linter.source = code
+    linter.initialize()
+    linter.open()
+    try:
+        linter.check_single_file_item(_SUBMISSION)
+    except astroid.AstroidError as e:
+        # Code astroid can't handle (e.g. very deeply nested expressions) is reported
+        # as an astroid-error message, like pylint's own check() does, not raised
+        linter.add_message('astroid-error', args=(_SUBMISSION.filepath, str(e)), confidence=HIGH)
+    return reporter
+
+def run_pylint(code: str, reporter_factory: Callable[[], BaseReporter]) -> BaseReporter:
+    """
+    Lint the given source in this process with the shared linter.
+    Returns the reporter, made by reporter_factory, that received the messages.
+    """
+    global _LINTER
+    with _PYLINT_LOCK:
+        if _LINTER is None:
+            _LINTER = _create_linter()
+        try:
+            return _lint(_LINTER, code, reporter_factory())
+        except Exception:
+            # Something went wrong inside pylint itself and the shared linter
+            # may be in a bad state, so retry once with a fresh one
+            _LINTER = _create_linter()
+            return _lint(_LINTER, code, reporter_factory())
+
+def warm_up_pylint() -> None:
+    """
+    Create the shared linter and lint a small snippet ahead of time, so the
+    first request doesn't pay for loading checkers and starting astroid.
+    """
+    run_pylint("print(len('warm up'))\n", CollectingReporter)
+
+# Parsed trees are shared between the analyzer and the suggestion helpers,
+# so the same submission is only parsed once. Trees are never modified.
+_PARSE_CACHE = LRUCache(maxsize=128, copy_values=False)
+
+# Loading a pickled tree only beats parsing for large sources
+# (about 40% faster at 10 KB and up, slower than parsing for small snippets)
+_AST_DISK_CACHE_MIN_LENGTH = 10000
+_AST_DISK_CACHE = None
+
+def _ast_disk_cache() -> Optional[DiskCache]:
+    """Return the on-disk AST cache if AST_CACHE_DIR is set, otherwise None."""
+    global _AST_DISK_CACHE
+    # Read on every call, since .env is loaded after this module is imported
+    directory = os.getenv('AST_CACHE_DIR')
+    if not directory:
+        return None
+    if _AST_DISK_CACHE is None or _AST_DISK_CACHE.directory != os.path.expanduser(directory):
+        _AST_DISK_CACHE = DiskCache(directory)
+    return _AST_DISK_CACHE
+
+def parse_or_errors(code: str) -> Tuple[Optional[ast.AST], List[Dict[str, Any]]]:
+    """
+    Parse code into an AST.
+    Returns (tree, []) on success, or (None, [syntax error]) if the code doesn't parse.
+    """
+    key = content_key(code)
+    parsed = _PARSE_CACHE.get(key)
+    if parsed is None:
+        disk_cache = _ast_disk_cache() if len(code) >= _AST_DISK_CACHE_MIN_LENGTH else None
+        # AST classes change between Python versions, so the version is part of the key
+        disk_key = content_key(sys.version, code) if disk_cache else None
+        tree = disk_cache.get(disk_key) if disk_cache else None
+        try:
+            if tree is None:
+                # Same as ast.parse without the wrapper. The source is passed as str on
+                # purpose: bytes would make error offsets byte-based for non-ASCII lines.
+                tree = compile(code, '<unknown>', 'exec', flags=ast.PyCF_ONLY_AST, dont_inherit=True)
+                if disk_cache:
+                    disk_cache.put(disk_key, tree)
+            parsed = (tree, [])
+        except SyntaxError as e:
+            parsed = (None, [{
+                'line': e.lineno,
+                'column': e.offset,
+                'message': str(e),
+                'msg': e.msg
+            }])
+        _PARSE_CACHE.put(key, parsed)
+    return parsed
+
+# Students often resubmit the same snippet, so keep recent results around.
+# Shared by all analyzers; each one's results are keyed by its name.
+_ANALYSIS_CACHE = LRUCache(maxsize=1024)
+
+def cached_analysis(name: str, code: str, analyze: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """Return the cached result of the analyzer called name for code, running analyze() on a miss."""
+    key = content_key(name, code)
+    result = _ANALYSIS_CACHE.get(key)
+    if result is None:
+        result = analyze()
+        _ANALYSIS_CACHE.put(key, result)
+    return result
+
+def syntax_error_result(error: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the analysis result for code that failed to parse, from a parse_or_errors error."""
+    line_num = error['line'] or 1
+    col_num = error['column'] or 0
+    return {
+        'error_count': 1,
         'warning_count': 0,
-        'error_types': {},
-        'output': '',
+        'error_types': {'syntax': 1},
+        'output': f"Line {line_num}, Col {col_num}: SyntaxError: {error['msg']}\n",
     }
-    
+
+def analyze_python_code(code: str, tree: Optional[ast.AST] = None) -> Dict[str, Any]:
+    """
+    Analyze Python code for errors and quality issues.
+    Pass tree if the code has already been parsed, to skip parsing it again.
+    Returns dict with error count, error types, and raw output.
+    """
+    return cached_analysis('analyzer', code, lambda: _analyze_python_code(code, tree))
+
+def _analyze_python_code(code: str, tree: Optional[ast.AST]) -> Dict[str, Any]:
+    """Run the actual analysis for analyze_python_code."""
     # Step 1: Check for syntax errors with ast
-    syntax_errors = []
-    try:
-        ast.parse(code)
-    except SyntaxError as e:
-        line_num = e.lineno or 1
-        col_num = e.offset or 0
-        error_msg = f"Line {line_num}, Col {col_num}: SyntaxError: {e.msg}"
-        result['output'] += error_msg + "\n"
-        result['error_count'] = 1
-        result['error_types']['syntax'] = 1
-        return result  # Return early for syntax errors
-    
-    # Step 2: Run pylint analysis
-    with tempfile.NamedTemporaryFile(suffix='.py', delete=False) as temp:
-        temp.write(code.encode())
-        temp_path = temp.name
+    if tree is None:
+        tree, syntax_errors = parse_or_errors(code)
+        if syntax_errors:
+            return syntax_error_result(syntax_errors[0])  # Return early for syntax errors
     
-    try:
-        pylint_output = subprocess.run(
-            ['pylint', temp_path],
-            capture_output=True,
-            text=True
-        )
-        
-        # Parse pylint output
-        for line in pylint_output.stdout.split('\n'):
-            if ':' in line:
-                parts = line.split(':')
-                if len(parts) >= 3:
-                    error_type = parts[2].strip().split()[0]
-                    if error_type.startswith('E'):
-                        result['error_count'] += 1
-                        result['error_types'][error_type] = result['error_types'].get(error_type, 0) + 1
-                    elif error_type.startswith('W'):
-                        result['warning_count'] += 1
-                        result['error_types'][error_type] = result['error_types'].get(error_type, 0) + 1
-                    result['output'] += line + '\n'
-    
-    finally:
-        os.unlink(temp_path)
-    
-    return result
+    # Step 2: Run pylint analysis in this process on the in-memory source
+    reporter = run_pylint(code, _AnalysisReporter)
+    return {
+        'error_count': reporter.error_count,
+        'warning_count': reporter.warning_count,
+        'error_types': reporter.error_types,
+        'output': ''.join(reporter.lines),
+    }
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Any, Optional
+
+def content_key(*parts: str) -> bytes:
+    """Return a short digest identifying the given strings."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b'\0')  # Keep ('ab', 'c') and ('a', 'bc') apart
+    return digest.digest()
+
+class LRUCache:
+    """
+    Bounded cache that evicts the least recently used entry when full.
+    Values are copied on the way in and out so callers can't mutate cached results,
+    unless copy_values is False for values that are only ever read.
+    """
+
+    def __init__(self, maxsize: int = 1024, copy_values: bool = True):
+        self.maxsize = maxsize
+        self.copy_values = copy_values
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            value = self._entries[key]
+        return deepcopy(value) if self.copy_values else value
+
+    def put(self, key: bytes, value: Any) -> None:
+        if self.copy_values:
+            value = deepcopy(value)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+class DiskCache:
+    """
+    Cache that pickles values into files in a directory, so entries survive
+    restarts and are shared between worker processes.
+    Entries beyond maxsize are removed, least recently used first, on the first
+    put and then every evict_every puts, since that means scanning the directory.
+    Failures to read or write are treated as cache misses.
+    """
+
+    def __init__(self, directory: str, maxsize: int = 10000, evict_every: int = 100):
+        self.directory = os.path.expanduser(directory)
+        self.maxsize = maxsize
+        self.evict_every = evict_every
+        self._puts = 0
+
+    def _path(self, key: bytes) -> str:
+        return os.path.join(self.directory, key.hex() + '.pkl')
+
+    def get(self, key: bytes) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)  # Mark as recently used
+            return value
+        except Exception:
+            return None
+
+    def put(self, key: bytes, value: Any) -> None:
+        temp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a temporary file first so other processes never read a partial entry
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._path(key))
+            temp_path = None
+            if self._puts % self.evict_every == 0:
+                self._evict()
+            self._puts += 1
+        except Exception:
+            pass
+        finally:
+            if temp_path is not None:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries beyond maxsize."""
+        with os.scandir(self.directory) as entries:
+            files = [entry for entry in entries if entry.name.endswith('.pkl')]
+        if len(files) <= self.maxsize:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files) - self.maxsize]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass  # Already removed by another worker
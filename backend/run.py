@@ -1,30 +1,47 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from analyzer import analyze_python_code
+from analyzer import analyze_python_code, warm_up_pylint
 import os
 from dotenv import load_dotenv
 
+# orjson encodes and decodes much faster than Flask's default JSON handling when it's installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Load pylint now rather than on the first request
+warm_up_pylint()
+
+def _json_response(payload, status=200):
+    """Serialize payload as a JSON response, with orjson if available."""
+    if orjson is None:
+        return jsonify(payload), status
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
+
 @app.route('/analyze', methods=['POST'])
 def analyze_code():
     try:
-        data = request.get_json()
+        data = orjson.loads(request.get_data()) if orjson is not None else request.get_json()
         code = data.get('code', '')
         
         if not code:
-            return jsonify({'error': 'No code provided'}), 400
+            return _json_response({'error': 'No code provided'}, 400)
             
         result = analyze_python_code(code)
-        return jsonify(result)
+        return _json_response(result)
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _json_response({'error': str(e)}, 500)
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5001))
-    app.run(host='0.0.0.0', port=port, debug=True) 
\ No newline at end of file
+    # The debugger and reloader are only for local development
+    debug = os.getenv('FLASK_DEBUG', '0') == '1'
+    app.run(host='0.0.0.0', port=port, debug=debug) 
\ No newline at end of file
@@ -0,0 +1,2 @@
+"""WSGI entry point, e.g. for gunicorn: gunicorn -w 4 -k gthread --threads 4 wsgi:app"""
+from run import app